@@ -5,11 +5,24 @@ Open Telemetry Semantic Conventions
 * [Definitions of the conventions](https://github.com/open-telemetry/semantic-conventions/tree/main/model)
 
 """
-import json
 import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterable
 
+import orjson
 import yaml
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+# Optional: COPY into Kuzu from memory rather than through intermediate JSON files
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
 from pythonjsonlogger.json import JsonFormatter
 import kuzu
 
@@ -19,6 +32,153 @@ logging.basicConfig(level=logging.INFO, handlers=[handler])
 
 log = logging.getLogger()
 
+# Parsed YAML files, so that unchanged files aren't parsed again on the next import.
+# Kept in the current directory rather than next to the (third party) conventions, and
+# stored as JSON rather than pickled, so that loading it can't run any code
+PARSE_CACHE_FILE = '.semconv_parse_cache.json'
+# Bump whenever _parse_file() changes what it returns, to discard entries parsed under the old rules
+PARSE_CACHE_VERSION = 1
+
+# OpenTelemetry 'type' field to Cypher node table name
+_NODE_TYPE_MAP = dict(metric='Metric', entity='Entity', span='Span', attribute_group='AttributeGroup', event='Event')
+
+# Distinguishes a missing key from one explicitly set to None
+_MISSING = object()
+
+# Short strings (eg 'recommended', 'stable') repeat throughout the conventions, so are worth interning
+_INTERN_MAX_LENGTH = 32
+# ... as do small dictionaries, which are shared rather than interned
+_FLYWEIGHT_MAX_SIZE = 4
+
+
+def iter_yaml_files(root: str, on_error=None):
+    """
+    Walk a directory tree for YAML files. Uses os.scandir() directly rather
+    than Path.rglob() to avoid creating a Path object and doing a glob match
+    for every directory entry, and because the entries' file type checks
+    don't need another stat() call.
+
+    :param root: top-level directory
+    :param on_error: called with the OSError for a directory that can't be read
+                     (like os.walk()); the directory is skipped either way
+    :return: generator of YAML file names
+    """
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(('.yaml', '.yml')) and entry.is_file():
+                        yield entry.path
+        except OSError as ex:
+            if on_error is not None:
+                on_error(ex)
+
+
+def _intern(value, flyweights: dict):
+    """
+    Intern the dictionary keys and short strings in parsed YAML, so that repeated
+    strings share one object and dictionary lookups can match on identity.
+    Small dictionaries nested in other dictionaries (eg a requirement_level of
+    {recommended: ...}) are shared in the same way.
+
+    :param value: parsed YAML value
+    :param flyweights: previously seen small dictionaries, keyed by their items
+    :return: value with its strings interned
+    """
+    value_type = type(value)
+    if value_type is dict:
+        interned = {}
+        for key, item in value.items():
+            item = _intern(item, flyweights)
+            # Only share dictionary values: list entries (groups, attributes) get modified later on
+            if type(item) is dict and len(item) <= _FLYWEIGHT_MAX_SIZE:
+                item = _flyweight(item, flyweights)
+            interned[sys.intern(key) if type(key) is str else key] = item
+        return interned
+    if value_type is list:
+        return [_intern(item, flyweights) for item in value]
+    if value_type is str and len(value) <= _INTERN_MAX_LENGTH:
+        return sys.intern(value)
+    return value
+
+
+def _flyweight(value: dict, flyweights: dict) -> dict:
+    """
+    Return the first-seen dictionary with the same items as this one
+
+    :param value: small dictionary
+    :param flyweights: previously seen small dictionaries, keyed by their items
+    :return: shared dictionary
+    """
+    # Include the types, as eg 1, 1.0 and True are equal and hash the same
+    key = tuple((name, type(item), item) for name, item in value.items())
+    try:
+        return flyweights.setdefault(key, value)
+    except TypeError:
+        # Contains lists or dictionaries, so can't be a key
+        return value
+
+
+def _join_examples(examples) -> str:
+    """
+    Examples are stored as a single string, one example per line
+
+    :param examples: list of examples, or a single example
+    :return: examples string, or None if there aren't any
+    """
+    examples_type = type(examples)
+    if examples_type is str or examples is None:
+        return examples
+    if examples_type is not list:
+        # A single numeric (or boolean) example
+        return str(examples)
+    if len(examples) == 1:
+        return str(examples[0])
+    # Sometimes get numeric values in examples.
+    # map() keeps the str() calls in C, and is a no-op for strings
+    return '\n'.join(map(str, examples))
+
+
+def _parse_file(path: str) -> tuple:
+    """
+    Parse a single YAML file. Runs in a worker process, so errors are
+    returned rather than logged or raised (exceptions pickle poorly).
+
+    :param path: YAML file name
+    :return: tuple of (YAML data, whether it can go in the parse cache, error summary, error message)
+    """
+    try:
+        with open(path, 'rb') as fd:
+            content = fd.read()
+        # Nothing to import without groups, so don't bother parsing.
+        # Deliberately loose (no 'groups:' at the start of a line), so that
+        # quoted keys, flow style and byte order marks can't cause a file to be skipped
+        if b'groups' not in content:
+            return None, True, None, None
+        yaml_data = yaml.load(content, Loader=SafeLoader)
+        return yaml_data, _json_round_trips(yaml_data), None, None
+    except yaml.YAMLError as ex:
+        return None, False, "Error parsing YAML file", str(ex)
+    except Exception as ex:
+        return None, False, "Error reading YAML file", f"{type(ex).__name__}: {ex}"
+
+
+def _json_round_trips(value) -> bool:
+    """
+    Check whether parsed YAML comes back unchanged from JSON. Dates, sets and
+    non-string keys don't, so files using them are left out of the parse cache.
+
+    :param value: parsed YAML value
+    :return: True if the value can be stored as JSON
+    """
+    try:
+        return orjson.loads(orjson.dumps(value)) == value
+    except orjson.JSONEncodeError:
+        return False
+
 
 class SemanticConventions(object):
     """
@@ -26,6 +186,9 @@ class SemanticConventions(object):
     Describes the nodes and relationships in the conventions
     """
 
+    # Attributes are read in the import loops, so skip the per-instance __dict__
+    __slots__ = ('path_start', 'log', 'relations', 'nodes', 'flyweights', 'unknown_sections', '_dispatch')
+
     def __init__(self, log=None):
         self.path_start = -1
         self.log = log
@@ -35,21 +198,23 @@ class SemanticConventions(object):
         """
         Reset all semantic convention data
         """
-        # Use the Cypher table names as indices, so it's easier to relate things
-        self.relations = dict(HasAttribute={}, HasEvent={}, AssociatedWith={})
+        # Use the Cypher table names as indices, so it's easier to relate things.
+        # Every group node type gets its lists up front, so adding a relation is a plain lookup
+        self.relations = {rel_name: {node_type: [] for node_type in _NODE_TYPE_MAP.values()}
+                          for rel_name in ('HasAttribute', 'HasEvent', 'AssociatedWith')}
         self.nodes = dict(Metric={}, Entity={}, Span={}, AttributeGroup={}, Event={}, Attribute={})
-
-    def nodetype2node(self, section: dict) -> str:
-        """
-        Map OpenTelemetry 'type' field to our Cypher node table name
-
-        :return: table name
-        """
-        mappings = dict(metric='Metric', entity='Entity', span='Span', attribute_group='AttributeGroup', event='Event')
-        node_type = section.get('type')
-        return mappings.get(node_type)
-
-    def import_conventions_from_dir(self, base_path: str):
+        self.flyweights = {}
+        # Groups with a type that doesn't map to a node table, reported at the end of an import
+        self.unknown_sections = []
+        # OpenTelemetry 'type' field to everything that add_groups() updates for it:
+        # (table name, nodes, HasAttribute, HasEvent and AssociatedWith relations)
+        self._dispatch = {
+            otel_type: (node_type, self.nodes[node_type], self.relations['HasAttribute'][node_type],
+                        self.relations['HasEvent'][node_type], self.relations['AssociatedWith'][node_type])
+            for otel_type, node_type in _NODE_TYPE_MAP.items()
+        }
+
+    def import_conventions_from_dir(self, base_path: str, cache_file: str = PARSE_CACHE_FILE):
         """
         Reads all semantic convention YAML files in a given directory and its subdirectories.
         Assumes the conventions from file structures from
@@ -58,6 +223,7 @@ class SemanticConventions(object):
 
         Args:
             base_path (str): The root directory to start the search from.
+            cache_file (str): Parse cache file, or None to always parse every file.
         """
         start_path = Path(base_path)
         if not start_path.is_dir():
@@ -65,17 +231,104 @@ class SemanticConventions(object):
             return
 
         self.path_start = -1
-        for file_path in start_path.rglob('*.y[a]ml'):
+        cache = self.load_parse_cache(cache_file) if cache_file else {}
+        updated_cache = {}
+        paths = []
+        stale_paths = []
+        errors = []
+
+        def walk_error(ex: OSError):
+            errors.append(dict(file_path=ex.filename, error="Error reading directory", error_message=str(ex)))
+
+        for file_path in iter_yaml_files(os.path.abspath(start_path), on_error=walk_error):
             try:
-                content = file_path.read_text(encoding='utf-8')
-                yaml_data = yaml.safe_load(content)
+                stat = os.stat(file_path)
+            except OSError as ex:
+                # Deleted or made unreadable since the walk
+                errors.append(dict(file_path=file_path, error="Error reading YAML file", error_message=str(ex)))
+                continue
+            entry = cache.get(file_path)
+            if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                updated_cache[file_path] = entry
+            else:
+                stale_paths.append(file_path)
+                updated_cache[file_path] = [stat.st_mtime_ns, stat.st_size, _MISSING]
+            paths.append(file_path)
+
+        # Send files in batches to save on inter-process round trips,
+        # but keep enough batches that every worker gets a share
+        chunksize = max(1, min(32, len(stale_paths) // (4 * (os.cpu_count() or 1))))
+        # Parsing is CPU-bound, so fan it out; merging stays in this process
+        # so that the nodes and relations don't need any locking
+        with ProcessPoolExecutor() as executor:
+            results = executor.map(_parse_file, stale_paths, chunksize=chunksize)
+            for file_path in paths:
+                entry = updated_cache[file_path]
+                yaml_data = entry[2]
+                if yaml_data is _MISSING:
+                    yaml_data, cacheable, error, error_message = next(results)
+                    if error:
+                        errors.append(dict(file_path=file_path, error=error, error_message=error_message))
+                    if cacheable:
+                        # Safe to share with the cache: add_groups() copies as it interns
+                        entry[2] = yaml_data
+                    else:
+                        del updated_cache[file_path]
                 if not isinstance(yaml_data, dict):
                     continue
-                self.add_groups(yaml_data)
-            except yaml.YAMLError as ex:
-                self.log.error("Error parsing YAML file", extra=dict(file_path=file_path, error_message=ex))
-            except Exception as ex:
-                self.log.exception(ex, extra=dict(file_path=file_path))
+                try:
+                    self.add_groups(yaml_data)
+                except Exception as ex:
+                    self.log.exception(ex, extra=dict(file_path=file_path))
+
+        # One log record per kind of problem rather than one per file or group, as each goes through the JSON formatter
+        if errors:
+            self.log.error("Unable to read YAML files", extra=dict(errors=errors))
+        if self.unknown_sections:
+            self.log.error("Unknown semantic conventions", extra=dict(sections=self.unknown_sections))
+            self.unknown_sections = []
+        if cache_file:
+            self.save_parse_cache(cache_file, updated_cache)
+
+    def load_parse_cache(self, cache_file: str) -> dict:
+        """
+        Read the parse cache, which maps each YAML file name to a list of
+        [modification time (ns), size, parsed YAML data]
+
+        :param cache_file: parse cache file name
+        :return: parse cache, empty if there isn't a usable one
+        """
+        try:
+            with open(cache_file, 'rb') as fd:
+                cache = orjson.loads(fd.read())
+            if not isinstance(cache, dict) or not isinstance(cache.get('files'), dict):
+                raise TypeError("Expected a dict of files")
+            # Written by another version: quietly start again
+            if cache.get('version') != PARSE_CACHE_VERSION:
+                return {}
+            return {file_path: entry for file_path, entry in cache['files'].items()
+                    if isinstance(entry, list) and len(entry) == 3}
+        except FileNotFoundError:
+            return {}
+        except Exception as ex:
+            self.log.error("Unable to read parse cache -- ignoring", extra=dict(
+                cache_file=cache_file, error_message=ex))
+            return {}
+
+    def save_parse_cache(self, cache_file: str, cache: dict):
+        """
+        Store the parse cache for the next import. The cache is only an
+        optimisation, so failing to write it doesn't fail the import.
+
+        :param cache_file: parse cache file name
+        :param cache: parse cache
+        """
+        try:
+            with open(cache_file, 'wb') as fd:
+                fd.write(orjson.dumps(dict(version=PARSE_CACHE_VERSION, files=cache)))
+        except Exception as ex:
+            self.log.warning("Unable to write parse cache -- ignoring", extra=dict(
+                cache_file=cache_file, error_message=ex))
 
     def add_groups(self, yaml_data):
         """
@@ -83,92 +336,94 @@ class SemanticConventions(object):
 
         :param yaml_data: semantic convention 'groups' entry
         """
-        for section in yaml_data.get('groups', []):
-            node_type = self.nodetype2node(section)
-            if node_type in self.nodes:
-                key = section['id']
-                del section['type']
-                self.nodes[node_type][key] = section
-                self.relate2attribute(node_type, key, section.get('attributes', []))
-                self.relate2event(node_type, key, section.get('events', []))
-
-                # Special processing
-                if 'entity_associations' in section:
-                    self.relate2associated_entity(node_type, key, section['entity_associations'])
-                if node_type == 'AttributeGroup' and \
-                        'display_name' not in section:
-                    section['display_name'] = key
-            else:
-                self.log.error("Unknown semantic convention", extra=dict(data=section, node_type=node_type))
-
-    def relate2attribute(self, node_type: str, node: str, attributes: list):
+        dispatch = self._dispatch
+        for section in _intern(yaml_data.get('groups', []), self.flyweights):
+            entry = dispatch.get(section.get('type'))
+            if entry is None:
+                self.unknown_sections.append(dict(id=section.get('id'), type=section.get('type')))
+                continue
+
+            node_type, table, attribute_rels, event_rels, entity_rels = entry
+            key = section['id']
+            # Copy without the type (which is implied by the table) rather than deleting it in place
+            section = {name: value for name, value in section.items() if name != 'type'}
+            table[key] = section
+            self.relate2attribute(attribute_rels, key, section.get('attributes', []))
+            self.relate2event(event_rels, key, section.get('events', []))
+
+            # Special processing
+            entities = section.get('entity_associations', _MISSING)
+            if entities is not _MISSING:
+                self.relate2associated_entity(entity_rels, key, entities)
+            if node_type == 'AttributeGroup':
+                section.setdefault('display_name', key)
+
+    def relate2attribute(self, rels: list, node: str, attributes: list):
         """
         Add a relation from a node type and node to an attribute.
         An attribute can either be a reference, or an object to be persisted.
 
-        :param node_type: node table name
+        :param rels: HasAttribute relations from the node's table
         :param node: name of the node
         :param attributes: list of attribute entries (dictionaries)
         """
-        rels = self.relations['HasAttribute'].setdefault(node_type, [])
+        rels_append = rels.append
+        attr_nodes = self.nodes['Attribute']
         for data in attributes:
-            edge_info = {'from': node}
-            if 'ref' in data:
-                edge_info['to'] = data['ref']
-                del data['ref']
+            if (ref := data.pop('ref', _MISSING)) is not _MISSING:
+                edge_info = {'from': node, 'to': ref}
                 requirement = data.get('requirement_level')
-                if isinstance(requirement, dict):
-                    if 'conditionally_required' in requirement:
-                        data['condition'] = requirement['conditionally_required']
+                # YAML only produces plain dicts, so skip the isinstance() machinery
+                if type(requirement) is dict:
+                    condition = requirement.get('conditionally_required', _MISSING)
+                    if condition is not _MISSING:
+                        data['condition'] = condition
                         data['requirement_level'] = 'conditionally_required'
-                    if 'recommended' in requirement:
-                        data['condition'] = requirement['recommended']
+                    condition = requirement.get('recommended', _MISSING)
+                    if condition is not _MISSING:
+                        data['condition'] = condition
                         data['requirement_level'] = 'recommended'
-                if 'examples' in data:
-                    # Sometimes get numeric values in examples
-                    data['examples'] = '\n'.join(str(x) for x in data['examples'])
+                if (examples := data.get('examples', _MISSING)) is not _MISSING:
+                    data['examples'] = _join_examples(examples)
                 edge_info.update(data)
             else:
                 attribute_name = data['id']
-                del data['type']
-                if 'examples' in data:
-                    # Sometimes get numeric values in examples
-                    data['examples'] = '\n'.join(str(x) for x in data['examples'])
-                self.nodes['Attribute'][attribute_name] = data
-                edge_info['to'] = attribute_name
-            rels.append(edge_info)
-
-    def relate2associated_entity(self, node_type: str, node: str, entities: list):
+                data.pop('type', None)
+                if (examples := data.get('examples', _MISSING)) is not _MISSING:
+                    data['examples'] = _join_examples(examples)
+                attr_nodes[attribute_name] = data
+                edge_info = {'from': node, 'to': attribute_name}
+            rels_append(edge_info)
+
+    def relate2associated_entity(self, rels: list, node: str, entities: list):
         """
         Metrics can have associated entities
 
-        :param node_type: node table name
+        :param rels: AssociatedWith relations from the node's table
         :param node: name of the node
         :param entities: list of entity entries (dictionaries)
         """
-        rels = self.relations['AssociatedWith'].setdefault(node_type, [])
+        rels_append = rels.append
         for entity in entities:
             # Evil hack: supposed to search entity table by 'name' or by 'id', which can be different
             # Choose the id, assume that the difference is that the id name starts with 'entity.'
             if not entity.startswith('entity'):
                 entity = 'entity.' + entity
-            edge_info = {'from': node, 'to': entity}
-            rels.append(edge_info)
+            rels_append({'from': node, 'to': entity})
 
-    def relate2event(self, node_type: str, node: str, events: list):
+    def relate2event(self, rels: list, node: str, events: list):
         """
         Spans can have associated events
 
-        :param node_type: node table name
+        :param rels: HasEvent relations from the node's table
         :param node: name of the node
         :param events: list of events entries (dictionaries)
         """
-        rels = self.relations['HasEvent'].setdefault(node_type, [])
+        rels_append = rels.append
         for event_name in events:
             if not event_name.startswith('event'):
                 event_name = 'event.' + event_name
-            edge_info = {'from': node, 'to': event_name}
-            rels.append(edge_info)
+            rels_append({'from': node, 'to': event_name})
 
     def add_attribute(self, attribute: dict):
         """
@@ -178,25 +433,47 @@ class SemanticConventions(object):
         """
         key = attribute['id']
         all_attributes = self.nodes['Attribute']
-        if key in all_attributes:
+        existing_attribute = all_attributes.get(key, _MISSING)
+        if existing_attribute is not _MISSING:
             self.log.error("Attribute key already exists -- skipping", extra=dict(
-                attribute_name=key, existing_attribute=all_attributes[key],
+                attribute_name=key, existing_attribute=existing_attribute,
                 incoming_attribute=attribute))
         else:
-            if 'examples' in attribute:
-                # Sometimes get numeric values in examples
-                attribute['examples'] = '\n'.join(str(x) for x in attribute['examples'])
+            if (examples := attribute.get('examples', _MISSING)) is not _MISSING:
+                attribute['examples'] = _join_examples(examples)
             all_attributes[key] = attribute
 
-    def save_import_file(self, filename: str, db_objects: list):
+    def node_columns(self, node_type: str, exclude: Iterable[str] = ()) -> dict:
         """
-        Store the intermediate statements as JSON for later import
+        Transpose the nodes of a table into columns, which DataFrame libraries
+        can take as-is instead of inferring a schema row by row
+
+        :param node_type: node table name
+        :param exclude: fields to leave out
+        :return: dictionary of column name to list of values
+        """
+        rows = self.nodes[node_type].values()
+        # Nodes don't all have the same fields, so use the union (in first-seen order)
+        fieldnames = {}
+        for row in rows:
+            fieldnames.update(dict.fromkeys(row))
+        for field in exclude:
+            fieldnames.pop(field, None)
+        return {field: [row.get(field) for row in rows] for field in fieldnames}
+
+    def save_import_file(self, filename: str, db_objects: Iterable[dict]):
+        """
+        Store the intermediate statements as newline-delimited JSON for later import.
+        Kuzu can stream one object per line rather than buffering one large array.
 
         :param filename: importable file name
         :param db_objects: list of objects to persist
         """
-        with open(filename, 'w') as fd:
-            json.dump(db_objects, fd)
+        # YAML can produce non-string keys, which the json module silently converted
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+        dumps = orjson.dumps
+        with open(filename, 'wb') as fd:
+            fd.writelines(dumps(db_object, option=option) for db_object in db_objects)
 
 
 class PersistenceKuzu(SemanticConventions):
@@ -206,6 +483,8 @@ class PersistenceKuzu(SemanticConventions):
     https://kuzudb.com/
     """
 
+    __slots__ = ('conn',)
+
     relation2node = {
         'HasAttribute': 'Attribute',
         'HasEvent': 'Event',
@@ -243,43 +522,129 @@ class PersistenceKuzu(SemanticConventions):
         if schema_file:
             with open(schema_file) as fd:
                 model_data = fd.read()
-            statements = model_data.split(';')
-            for statement in statements:
-                if statement.strip():
+            statements = [statement for statement in model_data.split(';') if statement.strip()]
+            # Kuzu accepts several statements in one call, which saves a round trip per statement.
+            # On failure, go one by one so that the offending statement gets reported.
+            # The schema only uses IF NOT EXISTS / INSTALL / LOAD, so re-running is harmless.
+            try:
+                self.conn.execute(';'.join(statements))
+            except Exception:
+                for statement in statements:
                     self.execute(statement)
 
+    def table_columns(self, table: str) -> list:
+        """
+        Look up the column definitions of a table
+
+        :param table: node or relation table name
+        :return: list of (column name, column type) tuples, in table order
+        """
+        result = self.conn.execute(f"CALL table_info('{table}') RETURN name, type")
+        return [tuple(row) for row in result.get_all()]
+
+    def arrow_table(self, columns: list, db_objects: Iterable[dict]):
+        """
+        Build an Arrow table to COPY into a Kuzu table. Kuzu maps DataFrame
+        columns by position rather than by name, so the columns follow the table
+        definition and anything else in the objects is dropped.
+
+        :param columns: list of (column name, column type) tuples, in table order
+        :param db_objects: objects to persist, which can be iterated over more than once
+        :return: pyarrow Table
+        """
+        arrays = {}
+        for name, column_type in columns:
+            if column_type == 'STRING':
+                # Sometimes get numeric values from the YAML
+                values = [value if (value := row.get(name)) is None or type(value) is str else str(value)
+                          for row in db_objects]
+                arrays[name] = pyarrow.array(values, type=pyarrow.string())
+            else:
+                arrays[name] = pyarrow.array([row.get(name) for row in db_objects])
+        return pyarrow.table(arrays)
+
+    def copy_job(self, table: str, filename: str, db_objects: Iterable[dict], options: str,
+                 key_columns: tuple = ()) -> tuple:
+        """
+        Work out how to COPY objects into a table: from an Arrow table if pyarrow
+        is available, otherwise from an import file
+
+        :param table: node or relation table name
+        :param filename: importable file name, if pyarrow isn't available
+        :param db_objects: objects to persist
+        :param options: COPY options
+        :param key_columns: leading columns that aren't table properties (eg 'from' and 'to' for relations)
+        :return: tuple of (COPY statement, function to prepare the data, its arguments)
+        """
+        if pyarrow is None:
+            return f"COPY {table} FROM '{filename}' {options}", self.save_import_file, (filename, db_objects)
+        # Look up the columns here rather than in the background thread that prepares the data,
+        # so the connection is only ever used from one thread
+        columns = [(name, 'STRING') for name in key_columns] + self.table_columns(table)
+        return f"COPY {table} FROM $df {options}", self.arrow_table, (columns, db_objects)
+
+    def run_copies(self, copies: list):
+        """
+        Run COPY statements, preparing the data for the next one in a background
+        thread while Kuzu loads the current one
+
+        :param copies: list of copy_job() tuples
+        """
+        if not copies:
+            return
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            _, prepare, args = copies[0]
+            pending = executor.submit(prepare, *args)
+            for index, (statement, _, _) in enumerate(copies):
+                future = pending
+                # Only ever one job ahead, so at most two tables are in memory at once
+                if index + 1 < len(copies):
+                    _, prepare, args = copies[index + 1]
+                    pending = executor.submit(prepare, *args)
+                try:
+                    table = future.result()
+                except Exception as ex:
+                    # Report and carry on, the same as a failed statement in execute()
+                    print(f"{ex} {statement}")
+                    continue
+                self.execute(statement, parameters=None if table is None else dict(df=table))
+                del table
+
     def persist_nodes(self):
         """
         Save node data in the database
         """
-        for node_type, data in self.nodes.items():
-            filename = node_type + 's.json'
-            self.save_import_file(filename, list(data.values()))
-            statement = f"COPY {node_type} FROM '{filename}' (ignore_errors=true)"
-            self.execute(statement)
+        copies = [self.copy_job(node_type, node_type + 's.json', data.values(), '(ignore_errors=true)')
+                  for node_type, data in self.nodes.items()]
+        self.run_copies(copies)
 
     def persist_relations(self):
         """
         Save relations data in the database
         """
+        copies = []
         for rel_name, rel_data in self.relations.items():
             rel_endpoint = self.relation2node.get(rel_name)
             for node_type, relations in rel_data.items():
-                filename = f'rel_{node_type}_{rel_name}.json'
-                self.save_import_file(filename, relations)
-                statement = f"COPY {rel_name} FROM '{filename}' (from='{node_type}', to='{rel_endpoint}')"
-                self.execute(statement)
+                # Most node types never have a given relation (and the schema doesn't allow it)
+                if not relations:
+                    continue
+                copies.append(self.copy_job(rel_name, f'rel_{node_type}_{rel_name}.json', relations,
+                                            f"(from='{node_type}', to='{rel_endpoint}')",
+                                            key_columns=('from', 'to')))
+        self.run_copies(copies)
 
-    def execute(self, statement: str, pdb_on_error: bool = False):
+    def execute(self, statement: str, pdb_on_error: bool = False, parameters: dict = None):
         """
         Execute the Cypher statement in the database
 
         :param statement: Cypher statement
         :param pdb_on_error: On error, run the interactive Python DeBugger (pdb)
+        :param parameters: values for any $parameters in the statement
         :return:
         """
         try:
-            self.conn.execute(statement)
+            self.conn.execute(statement, parameters or {})
         except Exception as ex:
             print(f"{ex} {statement}")
             if pdb_on_error:
@@ -73,9 +73,10 @@ def _(mo):
 
     ## Import the Data
 
-    Here's how to import the data
+    With `pyarrow` installed, the data is loaded into Kuzu straight from memory.
+    Without it, each table is written to a newline-delimited JSON file, which can also be imported by hand:
     ```
-        COPY Metric from 'metrics.json'
+        COPY Metric from 'Metrics.json'
     ```
     """
     )
@@ -83,11 +84,28 @@ def _(mo):
 
 
 @app.cell
-def _(log):
-    from build_semconv_db import PersistenceKuzu
+def _(log, mo):
+    import os
+    from build_semconv_db import PersistenceKuzu, iter_yaml_files
     START_PATH = '../semantic-conventions/model'
-    conventions = PersistenceKuzu(log)
-    conventions.import_conventions_from_dir(START_PATH)
+
+    # Editing other cells re-runs this one, so only re-import when the YAML files change
+    @mo.cache
+    def _load_conventions(start_path, stamp):
+        _conventions = PersistenceKuzu(log)
+        _conventions.import_conventions_from_dir(start_path)
+        return _conventions
+
+    # The file count catches deleted files, which the newest modification time would miss.
+    # A missing directory, or an unreadable one or file, is left to the import to report
+    _mtimes = []
+    if os.path.isdir(START_PATH):
+        for _path in iter_yaml_files(START_PATH):
+            try:
+                _mtimes.append(os.stat(_path).st_mtime_ns)
+            except OSError:
+                pass
+    conventions = _load_conventions(START_PATH, (len(_mtimes), max(_mtimes, default=0)))
     conventions.nodes.keys()
     return (conventions,)
 
@@ -115,8 +133,7 @@ def _(mo):
 
 @app.cell
 def _(DataFrame, conventions):
-    metrics = DataFrame(list(conventions.nodes['Metric'].values()))
-    metrics = metrics.drop(['attributes', 'entity_associations'])
+    metrics = DataFrame(conventions.node_columns('Metric', exclude=['attributes', 'entity_associations']), strict=False)
     metrics
     return
 
@@ -152,7 +169,7 @@ def _(conventions):
 
 @app.cell
 def _(DataFrame, conventions):
-    attributes = DataFrame(list(conventions.nodes['Attribute'].values()), strict=False)
+    attributes = DataFrame(conventions.node_columns('Attribute'), strict=False)
     attributes
     return
 